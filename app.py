@@ -1,7 +1,8 @@
 import streamlit as st
 import plotly.express as px
 import pandas as pd
-from utils.load_data import load_precip_data
+from utils.load_data import load_precip_data, select_year
+from utils.metrics import record_page_run
 import os
 import base64
 
@@ -9,10 +10,11 @@ import base64
 # PAGE CONFIGURATION
 # -----------------------------
 st.set_page_config(
-    page_title="Precipitaciones España 2021",
+    page_title="Precipitaciones España",
     page_icon="🌧️",
     layout="wide"
 )
+record_page_run("inicio")
 
 # -----------------------------
 # LOAD CUSTOM CSS (FORCE BLUE SIDEBAR + BLACK TEXT)
@@ -76,16 +78,22 @@ if os.path.exists(logo_path):
         unsafe_allow_html=True
     )
 
+# -----------------------------
+# SIDEBAR — YEAR
+# -----------------------------
+st.sidebar.header("Filtros")
+anio = select_year()
+
 # -----------------------------
 # HEADER
 # -----------------------------
-st.title("🌧️ Dashboard de Precipitaciones en España — 2021")
+st.title(f"🌧️ Dashboard de Precipitaciones en España — {anio}")
 st.markdown("Visualización interactiva de la precipitación mensual y anual por provincias.")
 
 # -----------------------------
 # LOAD DATA
 # -----------------------------
-df = load_precip_data()
+df = load_precip_data(anio)
 if "Provincia" not in df.columns:
     st.error("No se encontró la columna 'Provincia' en los datos.")
     st.stop()
@@ -96,7 +104,6 @@ MESES = ["enero","febrero","marzo","abril","mayo","junio",
 # -----------------------------
 # SIDEBAR — FILTERS
 # -----------------------------
-st.sidebar.header("Filtros")
 provincia_seleccion = st.sidebar.selectbox(
     "Provincia:",
     options=["Todas"] + sorted(df["Provincia"].unique())
@@ -6,24 +6,28 @@ import pandas as pd
 import os 
 import base64
 import plotly.express as px
-from utils.load_data import load_precip_data
+from utils.load_data import available_years, load_precip_data, load_precip_range, select_year
 from utils.sidebar_style import apply_sidebar_style
+from utils.metrics import record_page_run
 
 # -----------------------------
 # APPLY SIDEBAR STYLE (BLUE + BLACK TEXT + LOGO)
 # -----------------------------
 apply_sidebar_style()
+record_page_run("resumen")
 
 # -----------------------------
 # PAGE CONFIG
 # -----------------------------
-st.set_page_config(page_title="Resumen - Precipitaciones 2021", layout="wide")
+st.set_page_config(page_title="Resumen - Precipitaciones", layout="wide")
 
 # -----------------------------
 # LOAD DATA
 # -----------------------------
 # English: We load the main dataset using the shared utility function.
-df = load_precip_data()
+st.sidebar.header("Filtros")
+anio = select_year()
+df = load_precip_data(anio)
 
 # Standardize column names
 if "region" in df.columns:
@@ -41,8 +45,8 @@ for c in cols:
 # -----------------------------
 # TITLE & INTRO
 # -----------------------------
-st.title("🌍 Resumen nacional — Precipitaciones 2021")
-st.markdown("Visión general de las precipitaciones registradas en España durante 2021. Este panel reúne los indicadores clave y los gráficos principales.")
+st.title(f"🌍 Resumen nacional — Precipitaciones {anio}")
+st.markdown(f"Visión general de las precipitaciones registradas en España durante {anio}. Este panel reúne los indicadores clave y los gráficos principales.")
 
 st.markdown("---")
 
@@ -131,6 +135,34 @@ st.plotly_chart(fig_hist, use_container_width=True)
 
 st.markdown("---")
 
+# -----------------------------
+# LINE CHART: Evolución interanual
+# -----------------------------
+# English: Only shown when more than one year is available; years are loaded in parallel and cached one by one.
+anios = available_years()
+if len(anios) > 1:
+    st.subheader("📅 Evolución interanual de la precipitación")
+    desde, hasta = st.sidebar.select_slider("Rango de años:", options=anios, value=(anios[0], anios[-1]))
+
+    largo = load_precip_range(desde, hasta)
+    por_anio = (
+        largo.groupby(["Año", "Provincia"])["Precipitación"].sum(min_count=1)
+        .groupby("Año").mean()
+        .reset_index()
+    )
+
+    fig_anios = px.line(
+        por_anio,
+        x="Año",
+        y="Precipitación",
+        markers=True,
+        title="Precipitación anual media por provincia",
+        labels={"Precipitación": "Precipitación (mm)"}
+    )
+    st.plotly_chart(fig_anios, use_container_width=True)
+
+    st.markdown("---")
+
 # -----------------------------
 # FOOTER
 # -----------------------------
@@ -6,25 +6,31 @@ import plotly.express as px
 import unicodedata
 import os 
 import base64
-from utils.load_data import load_precip_data
+import numpy as np
+import pydeck as pdk
+from utils.load_data import load_precip_data, select_year
+from utils.stations import load_station_data, station_layer_urls
 from utils.sidebar_style import apply_sidebar_style
+from utils.metrics import record_page_run
 
 # -----------------------------
 # APPLY SIDEBAR STYLE (BLUE + BLACK TEXT + LOGO)
 # -----------------------------
 apply_sidebar_style()
+record_page_run("mapa")
 
 # -----------------------------
 # PAGE CONFIGURATION
 # -----------------------------
-st.set_page_config(page_title="Map - Precipitation 2021", layout="wide")
-st.title("🗺️ Map — Precipitation by Province (2021)")
+st.set_page_config(page_title="Map - Precipitation", layout="wide")
 st.sidebar.header("Map options")
+anio = select_year("Year")
+st.title(f"🗺️ Map — Precipitation by Province ({anio})")
 
 # -----------------------------
 # LOAD DATA
 # -----------------------------
-df = load_precip_data()
+df = load_precip_data(anio)
 if "region" in df.columns:
     df = df.rename(columns={"region": "Provincia"})
 
@@ -32,6 +38,7 @@ MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
          "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
 
 mes = st.sidebar.selectbox("Month / Annual", options=["anual"] + MESES, index=0)
+modo_mapa = st.sidebar.radio("Map mode", ["Provinces (choropleth)", "Stations (deck.gl)"], index=0)
 
 # -----------------------------
 # NORMALIZATION FUNCTION
@@ -52,17 +59,21 @@ def normalize(s):
 # LOAD GEOJSON
 # -----------------------------
 GEOJSON_URL = "https://raw.githubusercontent.com/codeforgermany/click_that_hood/main/public/data/spain-provinces.geojson"
-try:
-    geojson = requests.get(GEOJSON_URL, timeout=20).json()
-except Exception:
-    st.error("Could not load remote GeoJSON. Check connection or use a local file.")
-    st.stop()
 
-# Normalize names in GeoJSON
-geo_names_set = set()
-for f in geojson["features"]:
-    f["properties"]["name_norm"] = normalize(f["properties"].get("name"))
-    geo_names_set.add(f["properties"]["name_norm"])
+def load_geojson():
+    """Fetch the province GeoJSON (only needed for the choropleth and the centroid fallback)."""
+    try:
+        geojson = requests.get(GEOJSON_URL, timeout=20).json()
+    except Exception:
+        st.error("Could not load remote GeoJSON. Check connection or use a local file.")
+        st.stop()
+
+    # Normalize names in GeoJSON
+    geo_names_set = set()
+    for f in geojson["features"]:
+        f["properties"]["name_norm"] = normalize(f["properties"].get("name"))
+        geo_names_set.add(f["properties"]["name_norm"])
+    return geojson, geo_names_set
 
 # -----------------------------
 # MANUAL CSV -> GEOJSON MAPPING
@@ -124,6 +135,90 @@ df_map = df.groupby("Provincia", as_index=False).agg(
 df_map["geo_name"] = df_map["Provincia"].map(PROV_MAPPING)
 df_map["geo_norm"] = df_map["geo_name"].apply(normalize)
 
+# -----------------------------
+# STATION MODE (DECK.GL)
+# -----------------------------
+def geojson_centroids(geojson):
+    """Approximate centroid (mean of ring vertices) of each GeoJSON feature, keyed by 'name_norm'."""
+    centroids = {}
+    for f in geojson["features"]:
+        geom = f.get("geometry") or {}
+        polygons = geom.get("coordinates", [])
+        if geom.get("type") == "Polygon":
+            polygons = [polygons]
+        coords = [pt for poly in polygons for ring in poly for pt in ring]
+        if coords:
+            arr = np.asarray(coords, dtype=float)[:, :2]
+            centroids[f["properties"]["name_norm"]] = arr.mean(axis=0)
+    return centroids
+
+
+if modo_mapa == "Stations (deck.gl)":
+    estilo = st.sidebar.radio("Layer", ["Hexbin", "Points"], index=0)
+    radio_km = st.sidebar.slider("Hexagon radius (km)", 5, 100, 25, 5)
+
+    stations = load_station_data(anio)
+    grupo, unidad = f"estaciones{anio}", "estaciones"
+    if stations is None:
+        # Without a station file, fall back to one point per province (GeoJSON centroid)
+        st.info(f"No station file found (data/PREC_{anio}_Estaciones.csv). Showing one point per province.")
+        geojson, _ = load_geojson()
+        centroids = geojson_centroids(geojson)
+        stations = df_map[df_map["geo_norm"].isin(centroids.keys())].copy()
+        stations["lon"] = stations["geo_norm"].map(lambda n: centroids[n][0])
+        stations["lat"] = stations["geo_norm"].map(lambda n: centroids[n][1])
+        grupo, unidad = f"provincias{anio}", "provincias"
+
+    # Per-month tables are precomputed and written once as CSV files; the layer only gets the URL
+    capas = station_layer_urls(stations[["lon", "lat"] + [c for c in ["anual"] + MESES if c in stations.columns]], radio_km, grupo)
+    if mes not in capas:
+        st.error(f"Column '{mes}' not found in station data.")
+        st.stop()
+
+    if estilo == "Hexbin":
+        capa = capas[mes]["hex"]
+        layer = pdk.Layer(
+            "ColumnLayer",
+            data=capa["url"],
+            get_position="[lon, lat]",
+            get_elevation="v",
+            elevation_scale=100,
+            radius=radio_km * 1000,
+            disk_resolution=6,
+            get_fill_color="[n, 80, 255 - n, 200]",
+            extruded=True,
+            pickable=True,
+        )
+        tooltip = {"text": "{v} mm — {c} stations"}
+    else:
+        capa = capas[mes]["puntos"]
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data=capa["url"],
+            get_position="[lon, lat]",
+            get_radius=4000,
+            radius_min_pixels=2,
+            get_fill_color="[n, 80, 255 - n, 200]",
+            pickable=True,
+        )
+        tooltip = {"text": "{v} mm"}
+
+    deck = pdk.Deck(
+        layers=[layer],
+        initial_view_state=pdk.ViewState(latitude=40, longitude=-4, zoom=4.8, pitch=40 if estilo == "Hexbin" else 0),
+        map_style="light",
+        tooltip=tooltip,
+    )
+    st.subheader(f"Mapa de precipitación por estaciones — {mes.capitalize()}")
+    st.pydeck_chart(deck, use_container_width=True)
+    st.caption(f"{capa['n']} elementos · {len(stations)} {unidad}")
+    st.stop()
+
+# -----------------------------
+# PROVINCE MODE: MATCH WITH GEOJSON
+# -----------------------------
+geojson, geo_names_set = load_geojson()
+
 # Filter only provinces present in GeoJSON
 plot_df = df_map[df_map["geo_norm"].isin(geo_names_set)].copy()
 if plot_df.empty:
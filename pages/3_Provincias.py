@@ -4,8 +4,10 @@ import pandas as pd
 import plotly.express as px
 import os 
 import base64
-from utils.load_data import load_precip_data
+from utils.load_data import load_precip_data, select_year
 from utils.sidebar_style import apply_sidebar_style
+from utils.metrics import record_page_run
+from utils.similarity import load_similarity_matrices, most_similar
 # Mini-map imports
 import folium
 from streamlit_folium import st_folium
@@ -14,16 +16,19 @@ from streamlit_folium import st_folium
 # APPLY SIDEBAR STYLE (BLUE + BLACK TEXT + LOGO)
 # -----------------------------
 apply_sidebar_style()
+record_page_run("provincias")
 
 # -----------------------------
 # CONFIGURACIÓN DE LA PÁGINA
 # -----------------------------
-st.set_page_config(page_title="Provincias - Precipitaciones 2021", layout="wide")
+st.set_page_config(page_title="Provincias - Precipitaciones", layout="wide")
 
 # -----------------------------
 # CARGAR DATOS
 # -----------------------------
-df = load_precip_data()
+st.sidebar.header("Filtros")
+anio = select_year()
+df = load_precip_data(anio)
 
 # Normalizar columna de provincia
 if "region" in df.columns:
@@ -41,7 +46,73 @@ for c in numeric_cols:
 # -----------------------------
 # SIDEBAR
 # -----------------------------
-st.sidebar.header("Filtros")
+modo = st.sidebar.radio("Modo:", ["Provincia individual", "Comparar provincias"], index=0)
+
+# -----------------------------
+# MODO COMPARATIVA MULTI-PROVINCIA
+# -----------------------------
+if modo == "Comparar provincias":
+    opciones = sorted(df["Provincia"].unique())
+    seleccion = st.sidebar.multiselect("Provincias a comparar:", options=opciones, default=opciones[:3])
+    n_similares = st.sidebar.slider("Provincias similares por selección", 1, 10, 3, 1)
+
+    st.title(f"📍 Comparativa — Varias provincias ({anio})")
+    st.markdown("Perfiles mensuales superpuestos, matrices de similitud y provincias más parecidas.")
+
+    if len(seleccion) < 2:
+        st.info("Selecciona al menos dos provincias para comparar.")
+        st.stop()
+
+    # Las matrices se calculan una vez por dataset (cacheadas); aquí solo se recortan
+    corr_df, dist_df = load_similarity_matrices(anio)
+
+    st.subheader("📈 Precipitación mensual — Provincias seleccionadas")
+    comp_df = df[df["Provincia"].isin(seleccion)].melt(
+        id_vars=["Provincia"], value_vars=MESES, var_name="Mes", value_name="Valor"
+    )
+    comp_df["Mes"] = pd.Categorical(comp_df["Mes"], categories=MESES, ordered=True)
+    fig_comp = px.line(
+        comp_df.sort_values("Mes"),
+        x="Mes",
+        y="Valor",
+        color="Provincia",
+        markers=True,
+        title="Comparativa mensual entre provincias",
+        labels={"Valor": "Precipitación (mm)"}
+    )
+    st.plotly_chart(fig_comp, use_container_width=True)
+
+    st.markdown("---")
+
+    st.subheader("🔗 Similitud entre perfiles mensuales")
+    c1, c2 = st.columns(2)
+    fig_corr = px.imshow(
+        corr_df.loc[seleccion, seleccion],
+        text_auto=".2f",
+        zmin=-1,
+        zmax=1,
+        color_continuous_scale="RdBu",
+        title="Correlación de perfiles mensuales"
+    )
+    c1.plotly_chart(fig_corr, use_container_width=True)
+    fig_dist = px.imshow(
+        dist_df.loc[seleccion, seleccion],
+        text_auto=".0f",
+        color_continuous_scale="Viridis_r",
+        title="Distancia euclídea (mm)"
+    )
+    c2.plotly_chart(fig_dist, use_container_width=True)
+
+    st.markdown("---")
+
+    st.subheader("🧭 Provincias más similares")
+    similares = most_similar(corr_df, dist_df, seleccion, k=n_similares)
+    st.dataframe(
+        similares.style.format({"Distancia (mm)": "{:.1f}", "Correlación": "{:.2f}"}),
+        use_container_width=True
+    )
+    st.stop()
+
 provincia = st.sidebar.selectbox("Selecciona provincia:", options=sorted(df["Provincia"].unique()))
 top_n = st.sidebar.slider("Número de provincias en ranking (Top)", 5, 50, 10, 1)
 mes_ranking = st.sidebar.selectbox("Mes para ranking:", ["anual"] + MESES, index=0)
@@ -78,7 +149,7 @@ posicion_ranking = int(
 # -----------------------------
 # MOSTRAR KPIs
 # -----------------------------
-st.title(f"📍 Análisis — {provincia}")
+st.title(f"📍 Análisis — {provincia} ({anio})")
 st.markdown("KPIs y visualizaciones detalladas de la provincia seleccionada.")
 
 k1, k2, k3, k4 = st.columns(4)
@@ -0,0 +1,159 @@
+# utils/data_cube.py
+# Shared, memory-mapped data cube (year x fila x columna) for multi-worker deployments.
+#
+# Ingest (run once, and again whenever a CSV changes):
+#     python -m utils.data_cube
+#
+# Every Streamlit process then maps the same file read-only: no CSV parsing,
+# and the pages are shared through the OS page cache instead of being copied per process.
+import streamlit as st
+import numpy as np
+import pandas as pd
+import json
+import os
+from utils.load_data import DATA_DIR, csv_years, precip_csv_path, read_precip_csv
+
+CUBE_DIR = os.path.join(DATA_DIR, "cube")
+CUBE_PATH = os.path.join(CUBE_DIR, "precip_cube.npy")
+META_PATH = os.path.join(CUBE_DIR, "precip_cube.json")
+
+COLUMNAS = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
+            "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre", "anual"]
+
+
+# ---------------------------------------------------
+# FUNCTION: Ingest — write the cube and its metadata sidecar
+# ---------------------------------------------------
+def build_data_cube(years: list = None) -> dict:
+    """
+    Parse and clean the CSV files of the given years (all available by default)
+    and write them as a float64 .npy array of shape (años, filas, columnas):
+    each year keeps its CSV rows in their original order, padded with NaN up
+    to the longest year. The JSON sidecar stores, per year, the province of
+    each row, the original column order and the non-numeric columns
+    (e.g. 'parametro'). Both files are written to a temporary name and
+    swapped in atomically, so running workers keep reading their current
+    mapping until they re-attach.
+    Raises ValueError if a year lacks any of COLUMNAS or repeats a province.
+    """
+
+    years = sorted(years) if years else csv_years()
+    if not years:
+        raise FileNotFoundError(f"No hay archivos PREC_<año>_Provincias.csv en '{DATA_DIR}'.")
+
+    frames = {}
+    for year in years:
+        file_path = precip_csv_path(year)
+        df = read_precip_csv(file_path)
+
+        faltan = [c for c in COLUMNAS if c not in df.columns]
+        if faltan:
+            raise ValueError(f"Faltan columnas en {file_path}: {faltan}")
+
+        duplicadas = sorted(df.loc[df["Provincia"].duplicated(), "Provincia"].unique())
+        if duplicadas:
+            raise ValueError(f"Provincias repetidas en {file_path}: {duplicadas}")
+
+        frames[year] = df
+
+    n_filas = max(len(df) for df in frames.values())
+
+    os.makedirs(CUBE_DIR, exist_ok=True)
+    tmp_cube = CUBE_PATH + ".tmp.npy"
+    cube = np.lib.format.open_memmap(
+        tmp_cube, mode="w+", dtype=np.float64, shape=(len(years), n_filas, len(COLUMNAS))
+    )
+    cube[:] = np.nan
+    for i, year in enumerate(years):
+        df = frames[year]
+        cube[i, :len(df)] = df[COLUMNAS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    cube.flush()
+    del cube
+    os.replace(tmp_cube, CUBE_PATH)
+
+    meta = {
+        "years": years,
+        "columnas": COLUMNAS,
+        "dtype": "float64",
+        "shape": [len(years), n_filas, len(COLUMNAS)],
+        "orden": {str(year): list(df.columns) for year, df in frames.items()},
+        "texto": {
+            str(year): {
+                col: [None if pd.isna(v) else v for v in df[col].tolist()]
+                for col in df.columns if col not in COLUMNAS
+            }
+            for year, df in frames.items()
+        },
+        "fuentes": {str(year): os.path.getmtime(precip_csv_path(year)) for year in years},
+    }
+    tmp_meta = META_PATH + ".tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_meta, META_PATH)
+
+    return meta
+
+
+# ---------------------------------------------------
+# FUNCTION: Attach to the cube (once per process and cube version)
+# ---------------------------------------------------
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _attach_data_cube(signature: float):
+    """
+    Map the cube read-only. `signature` is the sidecar mtime, so a new
+    ingest makes every process re-attach on its next call; max_entries=1
+    drops the previous mapping so the replaced file is released.
+    """
+
+    with open(META_PATH, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    cube = np.load(CUBE_PATH, mmap_mode="r")
+    if list(cube.shape) != meta["shape"]:
+        return None, None
+
+    return cube, meta
+
+
+def attach_data_cube():
+    """Return (cube, meta) for the current cube, or (None, None) if it has not been built."""
+    if not (os.path.exists(META_PATH) and os.path.exists(CUBE_PATH)):
+        return None, None
+    return _attach_data_cube(os.path.getmtime(META_PATH))
+
+
+# ---------------------------------------------------
+# FUNCTION: DataFrame view of one year of the cube
+# ---------------------------------------------------
+def load_cube_frame(year: int):
+    """
+    Return the cleaned DataFrame for `year` backed by the memory-mapped cube
+    (no copy of the numeric values), or None if the cube does not contain the
+    year or its CSV changed after the last ingest. Rows, columns and their
+    order match read_precip_csv; the numeric values are read-only.
+    """
+
+    cube, meta = attach_data_cube()
+    if cube is None or year not in meta["years"]:
+        return None
+
+    csv_path = precip_csv_path(year)
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) != meta["fuentes"].get(str(year)):
+        return None
+
+    # The year's rows are the first n of its slab (CSV order); slicing keeps it a view
+    textos = {col: np.asarray(valores, dtype=object) for col, valores in meta["texto"][str(year)].items()}
+    block = cube[meta["years"].index(year), :len(textos["Provincia"])]
+
+    df = pd.DataFrame(block, columns=meta["columnas"], copy=False)
+
+    # Insert the non-numeric columns at their original position (keeps the numeric block a view)
+    for i, col in enumerate(meta["orden"][str(year)]):
+        if col in textos:
+            df.insert(i, col, textos[col])
+    return df
+
+
+if __name__ == "__main__":
+    meta = build_data_cube()
+    print(f"Cubo escrito en {CUBE_PATH}: años {meta['years']}, forma {tuple(meta['shape'])}")
@@ -1,31 +1,69 @@
 import streamlit as st
 import pandas as pd
+import glob
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.metrics import inc, tracked_cache_data
+
+DATA_DIR = "data"
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
+         "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
 
 # ---------------------------------------------------
-# FUNCTION: Load precipitation dataset
+# FUNCTION: Path of the CSV file for a given year
 # ---------------------------------------------------
-@st.cache_data(show_spinner=True)
-def load_precip_data(year: int = 2021) -> pd.DataFrame:
+def precip_csv_path(year: int) -> str:
+    """Return the path of the province CSV file for the selected year."""
+    return os.path.join(DATA_DIR, f"PREC_{year}_Provincias.csv")
+
+
+# ---------------------------------------------------
+# FUNCTION: Years available in the data folder
+# ---------------------------------------------------
+def csv_years() -> list:
+    """Return the sorted list of years that have a PREC_<year>_Provincias.csv file."""
+    years = []
+    for path in glob.glob(os.path.join(DATA_DIR, "PREC_*_Provincias.csv")):
+        match = re.search(r"PREC_(\d{4})_Provincias\.csv$", path)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def available_years() -> list:
+    """Return the sorted list of years available either as CSV files or in the data cube."""
+    from utils.data_cube import attach_data_cube
+
+    _, meta = attach_data_cube()
+    cube_years = meta["years"] if meta else []
+    return sorted(set(csv_years()) | set(cube_years))
+
+
+# ---------------------------------------------------
+# FUNCTION: Read and clean a precipitation CSV
+# ---------------------------------------------------
+def read_precip_csv(file_path: str) -> pd.DataFrame:
     """
-    Load the precipitation dataset for the selected year.
-    Returns a cleaned DataFrame with standardized 'Provincia' column.
+    Read and clean a precipitation CSV file without any Streamlit calls,
+    so it can also be used by offline ingest steps.
+    Raises FileNotFoundError / ValueError with a user-facing message.
     """
 
-    file_path = os.path.join("data", f"PREC_{year}_Provincias.csv")
-
     # Check if file exists
     if not os.path.exists(file_path):
-        st.error(f"No se encontró el archivo: {file_path}. Asegúrate de subirlo a la carpeta 'data'.")
-        st.stop()
+        raise FileNotFoundError(f"No se encontró el archivo: {file_path}. Asegúrate de subirlo a la carpeta 'data'.")
 
     # Load CSV
     df = pd.read_csv(file_path, sep=';', encoding="utf-8")
 
     # Check if DataFrame is empty
     if df.empty:
-        st.error(f"El archivo {file_path} está vacío.")
-        st.stop()
+        raise ValueError(f"El archivo {file_path} está vacío.")
 
     # Clean column names
     df.columns = df.columns.str.lower().str.strip()
@@ -40,10 +78,145 @@ def load_precip_data(year: int = 2021) -> pd.DataFrame:
             break
 
     if not found:
-        st.error(f"No se encontró ninguna columna de provincia en {file_path}. Columnas disponibles: {list(df.columns)}")
-        st.stop()
+        raise ValueError(f"No se encontró ninguna columna de provincia en {file_path}. Columnas disponibles: {list(df.columns)}")
 
     # Capitalize province names
     df["Provincia"] = df["Provincia"].str.title()
 
     return df
+
+
+# ---------------------------------------------------
+# FUNCTION: Cached CSV loader (fallback when no data cube exists)
+# ---------------------------------------------------
+@tracked_cache_data("load_precip_data", show_spinner=False)
+def _load_precip_csv(year: int, mtime: float) -> pd.DataFrame:
+    # `mtime` is only part of the cache key, so an edited CSV is read again.
+    # No Streamlit UI calls here: it also runs in load_precip_range's worker threads.
+    return read_precip_csv(precip_csv_path(year))
+
+
+def _load_year(year: int) -> pd.DataFrame:
+    """Cube view or cached CSV frame for `year`, without UI calls. Raises FileNotFoundError / ValueError."""
+    from utils.data_cube import load_cube_frame
+
+    df = load_cube_frame(year)
+    if df is not None:
+        inc("precip_loader_requests_total", "load_precip_data calls by data source.", source="cube")
+        return df
+
+    inc("precip_loader_requests_total", "load_precip_data calls by data source.", source="csv")
+    file_path = precip_csv_path(year)
+    mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0.0
+    return _load_precip_csv(year, mtime)
+
+
+# ---------------------------------------------------
+# FUNCTION: Load precipitation dataset
+# ---------------------------------------------------
+def load_precip_data(year: int = 2021) -> pd.DataFrame:
+    """
+    Load the precipitation dataset for the selected year.
+    Returns a cleaned DataFrame with standardized 'Provincia' column.
+    Attaches to the shared memory-mapped data cube when it has been built
+    (see utils/data_cube.py); otherwise parses the CSV file.
+
+    Treat the result as read-only: when it comes from the cube, the numeric
+    columns are backed by a read-only mapping and in-place writes
+    (df.loc[...] = ...) raise ValueError. Replacing whole columns
+    (df[col] = ...) is fine; call .copy() before editing values in place.
+    """
+
+    try:
+        # st.spinner only appears after a short delay, so cache hits don't flash it
+        with st.spinner(f"Cargando datos de {year}..."):
+            return _load_year(year)
+    except (FileNotFoundError, ValueError) as e:
+        st.error(str(e))
+        st.stop()
+
+
+# ---------------------------------------------------
+# FUNCTION: Dataset version (for cache keys of derived data)
+# ---------------------------------------------------
+def precip_data_version(year: int) -> tuple:
+    """
+    Return a value that changes whenever the data behind load_precip_data(year)
+    may change: the mtimes of the cube sidecar and of the year's CSV file.
+    """
+
+    from utils.data_cube import META_PATH
+
+    file_path = precip_csv_path(year)
+    return (
+        os.path.getmtime(META_PATH) if os.path.exists(META_PATH) else 0.0,
+        os.path.getmtime(file_path) if os.path.exists(file_path) else 0.0,
+    )
+
+
+# ---------------------------------------------------
+# FUNCTION: Load a range of years (long format)
+# ---------------------------------------------------
+def load_precip_range(start: int, end: int, max_workers: int = 8) -> pd.DataFrame:
+    """
+    Load every available year in [start, end] concurrently and return one
+    long-format DataFrame with columns 'Provincia', 'Año', 'Mes', 'Precipitación'.
+    Each year uses the same per-year cache as load_precip_data, so extending
+    the range only loads the new years. Worker threads make no Streamlit UI
+    calls: the spinner and any read errors are handled on the calling thread.
+    """
+
+    disponibles = set(available_years())
+    years = [y for y in range(start, end + 1) if y in disponibles]
+    if not years:
+        st.error(f"No hay datos para ningún año entre {start} y {end}.")
+        st.stop()
+
+    faltan = [y for y in range(start, end + 1) if y not in disponibles]
+    if faltan:
+        st.warning(f"Sin datos para: {', '.join(map(str, faltan))}.")
+
+    # The context only lets the caches find the runtime; workers never render anything
+    ctx = get_script_run_ctx()
+
+    def _load(year):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        try:
+            df = _load_year(year)
+        except (FileNotFoundError, ValueError) as e:
+            return year, None, str(e)
+        largo = df.melt(id_vars=["Provincia"], value_vars=[m for m in MESES if m in df.columns],
+                        var_name="Mes", value_name="Precipitación")
+        largo.insert(1, "Año", year)
+        return year, largo, None
+
+    with st.spinner(f"Cargando datos de {years[0]} a {years[-1]}..."):
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(years))) as pool:
+            resultados = list(pool.map(_load, years))
+
+    frames = [largo for _, largo, _ in resultados if largo is not None]
+    for year, _, error in resultados:
+        if error is not None:
+            st.error(f"{year}: {error}")
+    if not frames:
+        st.stop()
+
+    df = pd.concat(frames, ignore_index=True)
+    df["Precipitación"] = pd.to_numeric(df["Precipitación"], errors="coerce")
+    df["Mes"] = pd.Categorical(df["Mes"], categories=MESES, ordered=True)
+    return df
+
+
+# ---------------------------------------------------
+# FUNCTION: Sidebar year selector
+# ---------------------------------------------------
+def select_year(label: str = "Año:") -> int:
+    """Sidebar selectbox with the available years (latest selected by default)."""
+
+    years = available_years()
+    if not years:
+        st.error(f"No se encontró ningún archivo PREC_<año>_Provincias.csv en la carpeta '{DATA_DIR}'.")
+        st.stop()
+
+    return st.sidebar.selectbox(label, options=years, index=len(years) - 1)
@@ -0,0 +1,293 @@
+# utils/metrics.py
+# Process-wide metrics (cache hits/misses, cache memory, reruns per page, active sessions)
+# exported in Prometheus text format.
+#
+# Exposure is configured with environment variables (one value per server process):
+#     PRECIP_METRICS_PORT      -> serve http://127.0.0.1:<port>/metrics
+#     PRECIP_METRICS_FILE      -> write the metrics to this file periodically ('{pid}' is replaced)
+#     PRECIP_METRICS_INTERVAL  -> seconds between file writes (default 15)
+import streamlit as st
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SESSION_TIMEOUT_S = 300
+DEFAULT_INTERVAL_S = 15.0
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> value
+_histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+_sessions = {}      # session_id -> last seen (monotonic)
+_help = {}
+_exporter_started = False
+_local = threading.local()
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------
+# PRIMITIVES
+# ---------------------------------------------------
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def inc(name: str, help_text: str = "", value: float = 1.0, **labels):
+    """Increment a counter."""
+    key = (name, _labels(labels))
+    with _lock:
+        _help.setdefault(name, ("counter", help_text))
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, help_text: str = "", **labels):
+    """Record an observation in a histogram."""
+    key = (name, _labels(labels))
+    with _lock:
+        _help.setdefault(name, ("histogram", help_text))
+        hist = _histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+# ---------------------------------------------------
+# DECORATOR: st.cache_data with hit/miss tracking
+# ---------------------------------------------------
+def tracked_cache_data(name: str, **cache_kwargs):
+    """
+    Drop-in replacement for @st.cache_data(**cache_kwargs) that counts hits
+    and misses and times every lookup. The function body only runs on a miss,
+    which is how misses are detected (per thread, so concurrent sessions don't mix).
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def body(*args, **kwargs):
+            _local.misses[-1] = True
+            return func(*args, **kwargs)
+
+        # functools.wraps keeps func's name, signature and source for Streamlit's cache key
+        cached = st.cache_data(**cache_kwargs)(body)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # One flag per nested lookup (a cached function may call another one)
+            if not hasattr(_local, "misses"):
+                _local.misses = []
+            _local.misses.append(False)
+            start = time.perf_counter()
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                result = "miss" if _local.misses.pop() else "hit"
+                inc("precip_cache_requests_total", "st.cache_data lookups by result.", cache=name, result=result)
+                observe("precip_cache_lookup_seconds", time.perf_counter() - start,
+                        "st.cache_data lookup duration (includes computation on a miss).", cache=name, result=result)
+
+        wrapper.clear = cached.clear
+        return wrapper
+
+    return decorator
+
+
+# ---------------------------------------------------
+# FUNCTION: Record a page rerun
+# ---------------------------------------------------
+def record_page_run(page: str):
+    """
+    Count a rerun of `page` and mark the current session as active.
+    Also starts the exporter the first time it is called in the process.
+    """
+
+    start_exporter()
+    inc("precip_page_reruns_total", "Script reruns per page.", page=page)
+
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        ctx = None
+    if ctx is not None:
+        with _lock:
+            _sessions[ctx.session_id] = time.monotonic()
+            _prune_sessions()
+
+
+# ---------------------------------------------------
+# GAUGES COMPUTED AT SCRAPE TIME
+# ---------------------------------------------------
+def _prune_sessions():
+    """Drop sessions not seen for SESSION_TIMEOUT_S. Caller must hold _lock."""
+    limit = time.monotonic() - SESSION_TIMEOUT_S
+    for session_id in [s for s, seen in _sessions.items() if seen < limit]:
+        del _sessions[session_id]
+
+
+def _active_sessions() -> int:
+    with _lock:
+        _prune_sessions()
+        return len(_sessions)
+
+
+def _cache_bytes() -> dict:
+    """Memory held by Streamlit caches, from the runtime's own stats (empty outside a running server)."""
+    try:
+        from streamlit.runtime import Runtime
+        if not Runtime.exists():
+            return {}
+        stats = Runtime.instance().stats_mgr.get_stats()
+    except Exception:
+        return {}
+
+    # Older Streamlit returns a list of CacheStat, newer a mapping family -> stats
+    if hasattr(stats, "values"):
+        stats = [s for family in stats.values() for s in family]
+
+    totals = {}
+    for stat in stats:
+        if not all(hasattr(stat, a) for a in ("category_name", "cache_name", "byte_length")):
+            continue
+        key = (stat.category_name, stat.cache_name)
+        totals[key] = totals.get(key, 0) + stat.byte_length
+    return totals
+
+
+# ---------------------------------------------------
+# FUNCTION: Prometheus text format
+# ---------------------------------------------------
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Exact sample value: integers as such, other floats with full precision (never '%g')."""
+    value = float(value)
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+def render_prometheus() -> str:
+    """Return all metrics in Prometheus text exposition format (version 0.0.4)."""
+
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        help_texts = dict(_help)
+
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {help_texts[name][1]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {help_texts[name][1]}")
+            lines.append(f"# TYPE {name} histogram")
+        # observe() adds each value to every bucket it fits in, so counts are already cumulative
+        for bound, count in zip(LATENCY_BUCKETS, hist[:-2]):
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {hist[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist[-2])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+
+    lines.append("# HELP precip_active_sessions Sessions with a rerun in the last 5 minutes.")
+    lines.append("# TYPE precip_active_sessions gauge")
+    lines.append(f"precip_active_sessions {_active_sessions()}")
+
+    cache_bytes = _cache_bytes()
+    if cache_bytes:
+        lines.append("# HELP precip_cache_memory_bytes Memory held by Streamlit caches.")
+        lines.append("# TYPE precip_cache_memory_bytes gauge")
+        for (category, cache), value in sorted(cache_bytes.items()):
+            labels = _labels({"cache_type": category, "cache": cache})
+            lines.append(f"precip_cache_memory_bytes{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------
+# EXPORTER: local HTTP endpoint and/or periodic file
+# ---------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_metrics_file(path: str, interval: float):
+    # Failures are logged only when the error changes, so a bad path doesn't flood the log
+    last_error = None
+    while True:
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(render_prometheus())
+            os.replace(tmp, path)
+            if last_error is not None:
+                logger.info("Fichero de métricas %s escrito de nuevo", path)
+                last_error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if error != last_error:
+                logger.warning("No se pudo escribir el fichero de métricas %s: %s", path, error,
+                               exc_info=not isinstance(e, OSError))
+                last_error = error
+        time.sleep(interval)
+
+
+def start_exporter():
+    """Start the configured exporters once per process (no-op if none is configured)."""
+
+    global _exporter_started
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    port = os.environ.get("PRECIP_METRICS_PORT")
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="precip-metrics-http", daemon=True).start()
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo abrir el puerto de métricas %s: %s", port, e)
+
+    path = os.environ.get("PRECIP_METRICS_FILE")
+    if path:
+        raw_interval = os.environ.get("PRECIP_METRICS_INTERVAL", str(DEFAULT_INTERVAL_S))
+        try:
+            interval = float(raw_interval)
+            if not interval > 0:
+                raise ValueError("debe ser mayor que 0")
+        except ValueError as e:
+            logger.warning("PRECIP_METRICS_INTERVAL no válido (%s): %s; se usa %gs", raw_interval, e, DEFAULT_INTERVAL_S)
+            interval = DEFAULT_INTERVAL_S
+        path = path.replace("{pid}", str(os.getpid()))
+        threading.Thread(target=_write_metrics_file, args=(path, interval),
+                         name="precip-metrics-file", daemon=True).start()
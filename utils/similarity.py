@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+from utils.load_data import MESES, load_precip_data, precip_data_version
+from utils.metrics import tracked_cache_data
+
+
+# ---------------------------------------------------
+# FUNCTION: Pairwise similarity between monthly profiles
+# ---------------------------------------------------
+def pairwise_similarity(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the Pearson correlation and Euclidean distance matrices
+    between the rows of a (n_provincias x n_meses) array.
+    Missing months are filled with the row mean so they do not bias the profile.
+    """
+
+    values = np.asarray(values, dtype=float)
+    row_mean = np.nanmean(values, axis=1, keepdims=True)
+    values = np.where(np.isnan(values), row_mean, values)
+
+    # Correlation: dot product of centred, unit-norm rows
+    centred = values - values.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centred, axis=1, keepdims=True)
+    norms[norms == 0] = np.nan
+    unit = centred / norms
+    corr = np.clip(unit @ unit.T, -1.0, 1.0)
+
+    # Distance: ||a||² + ||b||² - 2·a·b, without building the n x n x m tensor
+    sq = np.einsum("ij,ij->i", values, values)
+    dist = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * (values @ values.T), 0.0))
+    np.fill_diagonal(dist, 0.0)
+
+    return corr, dist
+
+
+# ---------------------------------------------------
+# FUNCTION: Cached similarity matrices per dataset
+# ---------------------------------------------------
+@tracked_cache_data("load_similarity_matrices", show_spinner=False)
+def _similarity_matrices(year: int, version: tuple) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # `version` is only part of the cache key (see precip_data_version)
+    df = load_precip_data(year)
+    valores = df[MESES].apply(pd.to_numeric, errors="coerce")
+    df = valores.groupby(df["Provincia"]).mean()
+
+    corr, dist = pairwise_similarity(df.to_numpy())
+    provincias = df.index.tolist()
+
+    corr_df = pd.DataFrame(corr, index=provincias, columns=provincias)
+    dist_df = pd.DataFrame(dist, index=provincias, columns=provincias)
+    return corr_df, dist_df
+
+
+def load_similarity_matrices(year: int = 2021) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Build the province-by-province correlation and distance matrices for the
+    selected year. Computed once per dataset version and cached; widgets only slice them.
+    """
+    return _similarity_matrices(year, precip_data_version(year))
+
+
+# ---------------------------------------------------
+# FUNCTION: Most similar provinces for a selection
+# ---------------------------------------------------
+def most_similar(corr_df: pd.DataFrame, dist_df: pd.DataFrame, seleccion: list, k: int = 3) -> pd.DataFrame:
+    """
+    Return the k nearest provinces (by distance) for each selected province,
+    excluding the province itself. Only slices the precomputed matrices.
+    """
+
+    filas = []
+    for provincia in seleccion:
+        if provincia not in dist_df.index:
+            continue
+        vecinas = dist_df.loc[provincia].drop(provincia).nsmallest(k)
+        for rango, (vecina, distancia) in enumerate(vecinas.items(), start=1):
+            filas.append({
+                "Provincia": provincia,
+                "Rango": rango,
+                "Más similar": vecina,
+                "Distancia (mm)": distancia,
+                "Correlación": corr_df.at[provincia, vecina],
+            })
+
+    return pd.DataFrame(filas, columns=["Provincia", "Rango", "Más similar", "Distancia (mm)", "Correlación"])
@@ -0,0 +1,214 @@
+# utils/stations.py
+# Station-level precipitation for the deck.gl map mode.
+#
+# Expected file: data/PREC_<year>_Estaciones.csv (sep=';') with columns
+#     estacion;lat;lon;enero;...;diciembre;anual
+# ('latitud'/'longitud' are accepted as well; 'provincia' is optional).
+#
+# Layer data is not embedded in the deck.gl JSON: each month is written once as a
+# small CSV under static/deck/ (served by Streamlit with server.enableStaticServing)
+# and the layer receives its URL, so deck.gl fetches and parses the table itself.
+import streamlit as st
+import numpy as np
+import pandas as pd
+import os
+from utils.load_data import DATA_DIR
+from utils.metrics import tracked_cache_data
+
+COLUMNAS = ["anual", "enero", "febrero", "marzo", "abril", "mayo", "junio",
+            "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+KM_POR_GRADO = 111.32
+
+DECK_DIR = os.path.join("static", "deck")
+DECK_URL = "app/static/deck"
+
+
+# ---------------------------------------------------
+# FUNCTION: Load station dataset
+# ---------------------------------------------------
+@tracked_cache_data("load_station_data", show_spinner=True)
+def load_station_data(year: int = 2021):
+    """
+    Load the station-level precipitation file for the selected year.
+    Returns a DataFrame with 'lat', 'lon' and the month columns,
+    or None if the file is not available.
+    """
+
+    file_path = os.path.join(DATA_DIR, f"PREC_{year}_Estaciones.csv")
+    if not os.path.exists(file_path):
+        return None
+
+    df = pd.read_csv(file_path, sep=';', encoding="utf-8")
+    df.columns = df.columns.str.lower().str.strip()
+    df = df.rename(columns={"latitud": "lat", "longitud": "lon"})
+
+    if not {"lat", "lon"}.issubset(df.columns):
+        st.error(f"El archivo {file_path} necesita columnas 'lat' y 'lon'. Columnas disponibles: {list(df.columns)}")
+        st.stop()
+
+    for col in ["lat", "lon"] + [c for c in COLUMNAS if c in df.columns]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    return df.dropna(subset=["lat", "lon"]).reset_index(drop=True)
+
+
+# ---------------------------------------------------
+# FUNCTION: Hexagonal binning of points
+# ---------------------------------------------------
+def hexbin_aggregate(lon: np.ndarray, lat: np.ndarray, values: np.ndarray, radius_km: float) -> pd.DataFrame:
+    """
+    Aggregate points into flat-top hexagons of the given radius (km).
+    Coordinates are projected equirectangularly around the mean latitude,
+    which is accurate enough at the scale of the Iberian peninsula.
+    Returns one row per hexagon: centre (lon, lat), mean value 'v' and station count 'c'.
+    """
+
+    valid = ~np.isnan(values)
+    lon, lat, values = lon[valid], lat[valid], values[valid]
+    if len(values) == 0:
+        return pd.DataFrame(columns=["lon", "lat", "v", "c"])
+
+    lat0 = np.deg2rad(lat.mean())
+    x = lon * KM_POR_GRADO * np.cos(lat0)
+    y = lat * KM_POR_GRADO
+
+    # Axial coordinates of a flat-top hex grid, rounded through cube coordinates
+    q = (2.0 / 3.0) * x / radius_km
+    r = (-x / 3.0 + np.sqrt(3.0) / 3.0 * y) / radius_km
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+
+    cells, inverse = np.unique(np.stack([rq, rr], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    count = np.bincount(inverse)
+    mean = np.bincount(inverse, weights=values) / count
+
+    cx = radius_km * 1.5 * cells[:, 0]
+    cy = radius_km * np.sqrt(3.0) * (cells[:, 1] + cells[:, 0] / 2.0)
+
+    return pd.DataFrame({
+        "lon": cx / (KM_POR_GRADO * np.cos(lat0)),
+        "lat": cy / KM_POR_GRADO,
+        "v": mean,
+        "c": count,
+    })
+
+
+# ---------------------------------------------------
+# FUNCTION: Compact per-month layer data
+# ---------------------------------------------------
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep only short numeric columns, rounded, so the layer files stay small:
+    ~10 m precision on coordinates, 0.1 mm on values and a 0-255 colour index 'n'.
+    """
+
+    out = pd.DataFrame({
+        "lon": df["lon"].astype(float).round(4),
+        "lat": df["lat"].astype(float).round(4),
+        "v": df["v"].astype(float).round(1),
+    })
+    vmin, vmax = out["v"].min(), out["v"].max()
+    span = (vmax - vmin) or 1.0
+    out["n"] = ((out["v"] - vmin) / span * 255).round().astype("uint8")
+    if "c" in df.columns:
+        out["c"] = df["c"].astype("int32")
+    return out
+
+
+@tracked_cache_data("precompute_station_points", show_spinner=False)
+def precompute_station_points(points: pd.DataFrame) -> dict:
+    """
+    Precompute, for every month (and the annual total), the compact point
+    table. Independent of the hexagon radius.
+    """
+
+    capas = {}
+    for col in COLUMNAS:
+        if col not in points.columns:
+            continue
+        puntos = points[["lon", "lat", col]].rename(columns={col: "v"}).dropna()
+        capas[col] = _compact(puntos)
+
+    return capas
+
+
+@tracked_cache_data("precompute_station_hexbins", show_spinner=False)
+def precompute_station_hexbins(points: pd.DataFrame, radius_km: float = 25.0) -> dict:
+    """
+    Precompute, for every month (and the annual total), the hexbin
+    aggregation for one radius. Month changes in the UI only pick
+    an entry from the returned dict.
+    """
+
+    lon = points["lon"].to_numpy(dtype=float)
+    lat = points["lat"].to_numpy(dtype=float)
+
+    capas = {}
+    for col in COLUMNAS:
+        if col not in points.columns:
+            continue
+        values = points[col].to_numpy(dtype=float)
+        capas[col] = _compact(hexbin_aggregate(lon, lat, values, radius_km))
+
+    return capas
+
+
+# ---------------------------------------------------
+# FUNCTION: Per-month layer files served to deck.gl
+# ---------------------------------------------------
+def _write_layer_file(nombre: str, tabla: pd.DataFrame) -> bool:
+    """Write `tabla` as DECK_DIR/nombre unless it already exists. Returns True if written."""
+    ruta = os.path.join(DECK_DIR, nombre)
+    if os.path.exists(ruta):
+        return False
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    tabla.to_csv(tmp, index=False)
+    os.replace(tmp, ruta)
+    return True
+
+
+def _prune_layer_files(grupo: str, clave: str):
+    """Remove the files of older datasets of the same group (same prefix, different hash)."""
+    for nombre in os.listdir(DECK_DIR):
+        if nombre.startswith(f"{grupo}_") and not nombre.startswith(f"{grupo}_{clave}_"):
+            try:
+                os.remove(os.path.join(DECK_DIR, nombre))
+            except OSError:
+                pass
+
+
+def station_layer_urls(points: pd.DataFrame, radius_km: float = 25.0, grupo: str = "estaciones") -> dict:
+    """
+    Write every precomputed month table as a CSV file (one header, one line per
+    feature) and return {columna: {"puntos"|"hex": {"url": ..., "n": filas}}}.
+    Files are named <grupo>_<hash of the input>_..., so processes share them;
+    point files do not depend on the radius. When a group gets a new dataset,
+    the files of its previous datasets are removed.
+    """
+
+    clave = f"{pd.util.hash_pandas_object(points, index=False).sum() & 0xFFFFFFFFFFFF:012x}"
+    puntos = precompute_station_points(points)
+    hexagonos = precompute_station_hexbins(points, radius_km)
+
+    os.makedirs(DECK_DIR, exist_ok=True)
+    urls, nuevo_dataset = {}, False
+    for col, tabla in puntos.items():
+        nombre = f"{grupo}_{clave}_{col}_puntos.csv"
+        nuevo_dataset |= _write_layer_file(nombre, tabla)
+        urls[col] = {"puntos": {"url": f"{DECK_URL}/{nombre}", "n": len(tabla)}}
+    for col, tabla in hexagonos.items():
+        nombre = f"{grupo}_{clave}_{radius_km:g}km_{col}_hex.csv"
+        _write_layer_file(nombre, tabla)
+        urls[col]["hex"] = {"url": f"{DECK_URL}/{nombre}", "n": len(tabla)}
+
+    if nuevo_dataset:
+        _prune_layer_files(grupo, clave)
+
+    return urls